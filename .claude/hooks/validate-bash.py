@@ -7,28 +7,54 @@ Source: https://github.com/amulya-labs/claude-agents
 License: MIT (https://opensource.org/licenses/MIT)
 """
 
+from __future__ import annotations
+
 import json
+import marshal
+import os
 import re
+import stat
 import sys
-from pathlib import Path
+import time
+import zlib
 
-# Python 3.11+ has tomllib built-in
+# re's pattern parser, to inspect a pattern's structure
 try:
-    import tomllib
+    from re import _parser as sre_parse
 except ImportError:
-    # Fallback for Python < 3.11
-    try:
-        import tomli as tomllib
-    except ImportError:
-        print(
-            "Error: Python 3.11+ required, or install 'tomli' package for older versions",
-            file=sys.stderr,
-        )
-        sys.exit(1)
+    # Python < 3.11
+    import sre_parse
+
+# Optional: Aho-Corasick automaton for matching many literals in one pass
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Optional: RE2 for matching many regexes in one linear-time pass
+try:
+    import re2
+except ImportError:
+    re2 = None
 
 
 def load_config(config_path: str) -> dict:
     """Load and validate TOML configuration."""
+    # Only needed when the pattern cache is stale, so imported here
+    try:
+        # Python 3.11+ has tomllib built-in
+        import tomllib
+    except ImportError:
+        # Fallback for Python < 3.11
+        try:
+            import tomli as tomllib
+        except ImportError:
+            print(
+                "Error: Python 3.11+ required, or install 'tomli' package for older versions",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+
     try:
         with open(config_path, "rb") as f:
             return tomllib.load(f)
@@ -40,125 +66,455 @@ def load_config(config_path: str) -> dict:
         sys.exit(1)
 
 
-def extract_patterns(config: dict, category: str) -> list[tuple[str, str]]:
-    """Extract patterns for a category (deny/ask/allow).
+# Patterns that can't be wrapped in a named group of a larger alternation:
+# numbered backreferences and conditionals would point at the wrong group, and
+# global inline flags are only valid at the very start of an expression.
+UNUNIONABLE_RE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(\d|^\(\?[aiLmsux]+\)')
+
+# Python syntax that RE2 accepts with a different meaning: {,n} is a repeat
+# in Python but literal text in RE2, and [[:alpha:]] is a POSIX class only in
+# RE2. Patterns containing these are always matched with re.
+RE2_DIVERGENT_RE = re.compile(r'\{,|\[:')
+
+# A pattern with no regex metacharacters, optionally anchored with ^ and/or $.
+# Escaped punctuation such as \. counts as the literal character.
+LITERAL_RE = re.compile(r'(\^?)((?:[^.^$*+?{}\[\]\\|()]|\\[^A-Za-z0-9])*)(\$?)', re.DOTALL)
+
+
+class PatternSet:
+    """Compiled patterns for one category (deny/ask/allow).
+
+    Built from the plain data extract_patterns gets out of the config, which is
+    also what the cache stores. The regexes and optional matchers are compiled
+    here. Patterns refer to their section by its index in config order, and
+    each list below keeps config order too.
+    """
+
+    __slots__ = (
+        "data",  # Constructor arguments, for the cache
+        "sections",  # Section names, in config order
+        "exact",  # ^literal$ -> section index
+        "prefixes",  # ^literal, checked with one startswith() call
+        "prefix_sections",  # ^literal -> section index
+        "prefix_lengths",  # Distinct prefix lengths, ascending
+        "substrings",  # Unanchored literals
+        "substring_sections",  # Section index for each substring
+        "substring_automaton",  # Aho-Corasick automaton of substrings, if available
+        "anchored",  # Alternation of ^ patterns, run with match()
+        "anchored_sections",  # Section index for each anchored group index
+        "searched",  # Patterns searched one by one
+        "searched_sections",  # Section index for each searched pattern
+        "native_searched",  # Patterns in native_set
+        "native_sections",  # Section index for each native pattern
+        "native_set",  # RE2 set of native_searched, if available
+    )
+
+    def __init__(
+        self,
+        sections: list[str],
+        exact: dict[str, int],
+        prefix_sections: dict[str, int],
+        substrings: list[str],
+        substring_sections: list[int],
+        anchored: str | None,
+        anchored_sections: list[int | None],
+        searched: list[str],
+        searched_flags: list[int],
+        searched_sections: list[int],
+    ):
+        self.data = (
+            sections, exact, prefix_sections, substrings, substring_sections,
+            anchored, anchored_sections, searched, searched_flags, searched_sections,
+        )
+        self.sections = sections
+        self.exact = exact
+        self.prefixes = tuple(prefix_sections)
+        self.prefix_sections = prefix_sections
+        self.prefix_lengths = tuple(sorted({len(prefix) for prefix in prefix_sections}))
+        self.substrings = substrings
+        self.substring_sections = substring_sections
+        self.substring_automaton = None
+        if ahocorasick is not None and substrings:
+            self.substring_automaton = ahocorasick.Automaton()
+            for substring, section in zip(reversed(substrings), reversed(substring_sections)):
+                # Added in reverse so the first pattern wins for duplicate literals
+                self.substring_automaton.add_word(substring, section)
+            self.substring_automaton.make_automaton()
+
+        # The union only holds patterns compiled with re.ASCII
+        self.anchored = None if anchored is None else re.compile(anchored, re.ASCII)
+        self.anchored_sections = anchored_sections
+
+        compiled = [re.compile(pattern, flags) for pattern, flags in zip(searched, searched_flags)]
+        self.searched = compiled
+        self.searched_sections = searched_sections
+        self.native_searched = []
+        self.native_sections = []
+        self.native_set = None
+        if re2 is not None:
+            candidates = [
+                i for i, pat in enumerate(compiled)
+                if pat.flags & re.ASCII and not RE2_DIVERGENT_RE.search(pat.pattern)
+            ]
+            self.native_set, accepted = compile_native_set([compiled[i].pattern for i in candidates])
+            native = [candidates[i] for i in accepted]
+            self.native_searched = [compiled[i] for i in native]
+            self.native_sections = [searched_sections[i] for i in native]
+            native_indexes = set(native)
+            self.searched = [pat for i, pat in enumerate(compiled) if i not in native_indexes]
+            self.searched_sections = [
+                section for i, section in enumerate(searched_sections) if i not in native_indexes
+            ]
+
+    def is_empty(self) -> bool:
+        """Check if the category has no patterns at all."""
+        return not (self.exact or self.prefixes or self.substrings
+                    or self.anchored or self.searched or self.native_searched)
+
+    def has_literal_in(self, text: str) -> bool:
+        """Check if any literal pattern occurs anywhere in text."""
+        return (any(literal in text for literal in self.exact)
+                or any(prefix in text for prefix in self.prefixes)
+                or any(substring in text for substring in self.substrings))
+
+    def drop_literals(self):
+        """Remove the literal patterns."""
+        self.exact = {}
+        self.prefixes = ()
+        self.prefix_sections = {}
+        self.prefix_lengths = ()
+        self.substrings = []
+        self.substring_sections = []
+        self.substring_automaton = None
+
+
+def compile_pattern(pattern: str) -> re.Pattern[str]:
+    """Compile a config pattern.
+
+    Patterns get ASCII-only \\s, \\w, \\b etc. (bash only splits words on ASCII
+    whitespace) unless they opt back into Unicode with a (?u) flag.
+    """
+    try:
+        return re.compile(pattern, re.ASCII)
+    except ValueError:
+        # Only a (?u) flag clashes with re.ASCII
+        return re.compile(pattern)
+
+
+def has_top_level_alternation(pattern: str) -> bool:
+    """Check if pattern has a | outside any group.
+
+    Asks re's own parser, so comments, verbose mode, escapes and character
+    classes are read exactly as re reads them. Branches that all start with
+    ^ come back with the ^ factored out, which still counts as anchored.
+    """
+    return any(op == sre_parse.BRANCH for op, _ in sre_parse.parse(pattern))
+
+
+def join_union(branches: list[tuple[str, int, int]]) -> tuple[str | None, list[int | None]]:
+    """Join (pattern, group_count, section) branches into one alternation.
 
-    Returns list of (pattern, section_name) tuples.
+    Returns the alternation (None if there are no branches) and the section
+    for each of its group indexes.
+    """
+    if not branches:
+        return None, []
+    parts = []
+    # Group 0 is the whole match, which is never a lastindex
+    group_sections = [None]
+    for i, (pattern, groups, section) in enumerate(branches):
+        parts.append(f"(?P<s{i}>{pattern})")
+        # The wrapping group plus any groups inside the pattern all map back
+        # to its section, whichever one ends up as lastindex
+        group_sections.extend([section] * (1 + groups))
+    return "|".join(parts), group_sections
+
+
+def compile_native_set(patterns: list[str]) -> tuple[re2.Set | None, list[int]]:
+    """Compile patterns into an RE2 search set, skipping any RE2 rejects.
+
+    Returns the set (None if it would be empty) and the indexes of the
+    patterns it holds, in set order.
+    """
+    options = re2.Options()
+    options.never_capture = True
+    options.log_errors = False
+    native_set = re2.Set.SearchSet(options)
+    accepted = []
+    for i, pattern in enumerate(patterns):
+        try:
+            native_set.Add(pattern)
+        except re2.error:
+            # Backreferences, lookarounds and other re-only syntax
+            continue
+        accepted.append(i)
+    if not accepted:
+        return None, []
+    native_set.Compile()
+    return native_set, accepted
+
+
+def extract_patterns(config: dict, category: str) -> PatternSet:
+    """Extract and compile patterns for a category (deny/ask/allow).
+
+    Literal patterns are checked with plain string operations (unanchored ones
+    with a single Aho-Corasick pass when pyahocorasick is installed) and ^-anchored
+    patterns are joined into one alternation run with match(). The rest are
+    searched one by one, which lets the regex engine skip ahead to each
+    pattern's literal prefix (a joined alternation can't). When google-re2 is
+    installed, those it supports are instead matched together by one RE2 set.
+    Invalid regexes are reported once here and skipped.
     """
-    patterns = []
+    sections = []
+    exact = {}
+    prefix_sections = {}
+    substrings = []
+    substring_sections = []
+    anchored_branches = []
+    searched = []
+    searched_flags = []
+    searched_sections = []
     for section_name, section in config.get(category, {}).items():
         if isinstance(section, dict) and "patterns" in section:
+            section_label = f"{category}.{section_name}"
+            section_index = len(sections)
+            sections.append(section_label)
             for pattern in section["patterns"]:
-                patterns.append((pattern, f"{category}.{section_name}"))
-    return patterns
+                try:
+                    compiled = compile_pattern(pattern)
+                except re.error as e:
+                    print(f"Warning: Invalid regex '{pattern}' in {section_label}: {e}", file=sys.stderr)
+                    continue
+
+                literal = LITERAL_RE.fullmatch(pattern)
+                if literal and (literal[1] or not literal[3]):
+                    text = re.sub(r'\\(.)', r'\1', literal[2], flags=re.DOTALL)
+                    if literal[1] and literal[3]:
+                        exact.setdefault(text, section_index)
+                    elif literal[1] or not text:
+                        # An empty pattern matches anywhere, like an empty prefix
+                        prefix_sections.setdefault(text, section_index)
+                    else:
+                        substrings.append(text)
+                        substring_sections.append(section_index)
+                elif (pattern.startswith('^') and not has_top_level_alternation(pattern)
+                        and not compiled.groupindex and not UNUNIONABLE_RE.search(pattern)):
+                    anchored_branches.append((pattern, compiled.groups, section_index))
+                else:
+                    searched.append(pattern)
+                    searched_flags.append(compiled.flags)
+                    searched_sections.append(section_index)
+
+    anchored, anchored_sections = join_union(anchored_branches)
+    return PatternSet(
+        sections, exact, prefix_sections, substrings, substring_sections,
+        anchored, anchored_sections, searched, searched_flags, searched_sections,
+    )
+
+
+def get_cache_path(config_path: str) -> str | None:
+    """Get the compiled-pattern cache file for a config.
+
+    Lives in a per-user directory under the temp dir. Returns None if that
+    directory can't be created or isn't safe to load the cache from.
+    """
+    tmp_dir = os.environ.get("TMPDIR") or os.environ.get("TEMP") or os.environ.get("TMP") or "/tmp"
+    cache_dir = os.path.join(tmp_dir, f"claude-hook-cache-{os.getuid()}")
+    try:
+        try:
+            os.mkdir(cache_dir, 0o700)
+        except FileExistsError:
+            pass
+        st = os.lstat(cache_dir)
+    except OSError:
+        return None
+    # Must be a real directory (not a symlink), owned by us, writable only by us
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o022:
+        return None
+    # The key holds the full path, so a name collision only forces a rebuild
+    name_hash = zlib.crc32(os.path.abspath(config_path).encode())
+    return os.path.join(cache_dir, f"validate-bash-{name_hash:08x}.cache")
+
+
+# Cache files (including temp files left by an interrupted write) that
+# haven't been rewritten for this long are removed
+CACHE_RETENTION_SECONDS = 15 * 24 * 60 * 60
+
+
+def prune_cache(cache_dir: str):
+    """Remove old cache files.
+
+    Only called when a cache is rebuilt, the one time files get added, so it
+    needs no throttling of its own.
+    """
+    cutoff = time.time() - CACHE_RETENTION_SECONDS
+    try:
+        with os.scandir(cache_dir) as entries:
+            for entry in entries:
+                try:
+                    if (entry.name.startswith("validate-bash-")
+                            and entry.stat(follow_symlinks=False).st_mtime < cutoff):
+                        os.unlink(entry.path)
+                except OSError:
+                    continue
+    except OSError:
+        pass
+
+
+def get_cache_key(config_path: str) -> tuple:
+    """Fingerprint everything the compiled patterns depend on."""
+    config_stat = os.stat(config_path)
+    script_stat = os.stat(__file__)
+    return (
+        os.path.abspath(config_path),
+        config_stat.st_mtime_ns, config_stat.st_size,
+        script_stat.st_mtime_ns, script_stat.st_size,
+        sys.version_info[:2], ahocorasick is not None, re2 is not None,
+    )
+
+
+def load_patterns(config_path: str) -> tuple[PatternSet, PatternSet, PatternSet]:
+    """Load (deny, ask, allow) patterns, reusing the cache when it's current.
+
+    The cache is written with marshal, which needs no import and only holds
+    the plain data each PatternSet is built from.
+    """
+    cache_path = get_cache_path(config_path)
+    try:
+        cache_key = get_cache_key(config_path)
+    except OSError:
+        # Missing config is reported by load_config
+        cache_path = None
+
+    if cache_path is not None:
+        try:
+            with open(cache_path, "rb") as f:
+                cached_key, cached_data = marshal.load(f)
+            if cached_key == cache_key:
+                return tuple(PatternSet(*data) for data in cached_data)
+        except Exception:
+            # Missing, stale or unreadable cache: rebuild it below
+            pass
+
+    config = load_config(config_path)
+    pattern_sets = tuple(extract_patterns(config, category) for category in ("deny", "ask", "allow"))
+
+    if cache_path is not None:
+        # Write to a temp file and rename so readers never see a partial cache
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                marshal.dump((cache_key, [patterns.data for patterns in pattern_sets]), f)
+            os.replace(tmp_path, cache_path)
+        except (OSError, ValueError):
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        prune_cache(os.path.dirname(cache_path))
+
+    return pattern_sets
+
+
+# One leading VAR=value assignment, with the value in any of the forms
+# VAR="value", VAR='value', VAR=`cmd`, VAR=$(cmd), VAR=$VAR or a bare word.
+# Unterminated quotes and substitutions run to the end of input. A $(...)
+# containing nested parentheses doesn't match and is handled separately.
+ENV_ASSIGN_RE = re.compile(r'''
+    \s*[A-Za-z_][A-Za-z0-9_]*=
+    (?: "(?:\\.|[^"\\])*(?:"|\\?\Z)
+      | '[^']*(?:'|\Z)
+      | `[^`]*(?:`|\Z)
+      | \$\([^()]*(?:\)|\Z)
+      | \$[A-Za-z_][A-Za-z0-9_]*
+      | (?!\$\()\S*\s*
+    )
+''', re.DOTALL | re.VERBOSE)
+ENV_SUBST_RE = re.compile(r'\s*[A-Za-z_][A-Za-z0-9_]*=\$\(')
+PAREN_RE = re.compile(r'[()]')
 
 
 def strip_env_vars(cmd: str) -> str:
     """Strip environment variable assignments from command start."""
+    pos = 0
     while True:
-        cmd = cmd.lstrip()
-        # Match: VAR=value, VAR="value", VAR='value', VAR=$(cmd), VAR=$VAR
-        match = re.match(r'^[A-Za-z_][A-Za-z0-9_]*=', cmd)
+        match = ENV_ASSIGN_RE.match(cmd, pos)
+        if match:
+            pos = match.end()
+            continue
+
+        match = ENV_SUBST_RE.match(cmd, pos)
         if not match:
             break
 
-        rest = cmd[match.end():]
-
-        if rest.startswith('$('):
-            # Command substitution $(...)
-            depth = 1
-            i = 2
-            while depth > 0 and i < len(rest):
-                if rest[i] == '(':
-                    depth += 1
-                elif rest[i] == ')':
-                    depth -= 1
-                i += 1
-            cmd = rest[i:]
-        elif rest.startswith('`'):
-            # Backtick substitution
-            end = rest.find('`', 1)
-            cmd = rest[end + 1:] if end > 0 else ""
-        elif rest.startswith('"'):
-            # Double-quoted value
-            i = 1
-            while i < len(rest):
-                if rest[i] == '\\' and i + 1 < len(rest):
-                    i += 2
-                    continue
-                if rest[i] == '"':
-                    break
-                i += 1
-            cmd = rest[i + 1:]
-        elif rest.startswith("'"):
-            # Single-quoted value
-            end = rest.find("'", 1)
-            cmd = rest[end + 1:] if end > 0 else ""
-        elif rest.startswith('$') and len(rest) > 1 and re.match(r'[A-Za-z_]', rest[1]):
-            # Variable reference $VAR
-            match = re.match(r'^\$[A-Za-z_][A-Za-z0-9_]*', rest)
-            cmd = rest[match.end():] if match else rest
-        else:
-            # Unquoted value - ends at whitespace
-            match = re.match(r'^[^\s]*\s*', rest)
-            cmd = rest[match.end():] if match else ""
-
-    return cmd.lstrip()
+        # Command substitution $(...) with nested parentheses. Jump from
+        # paren to paren rather than stepping through every character.
+        depth = 1
+        pos = match.end()
+        while depth > 0:
+            paren = PAREN_RE.search(cmd, pos)
+            if not paren:
+                pos = len(cmd)
+                break
+            depth += 1 if paren.group() == '(' else -1
+            pos = paren.end()
+
+    return cmd[pos:].lstrip()
+
+
+# Tokenizer for split_commands. Quoted strings run to the matching quote (or
+# end of input) and a quote preceded by an odd number of backslashes is
+# literal. Backslashes only pair up with other backslashes or quotes, so
+# separators are never escaped. Every character falls into some token.
+TOKEN_RE = re.compile(r'''
+    "(?:\\.|[^"\\])*(?:"|\\?\Z)
+  | '(?:\\.|[^'\\])*(?:'|\\?\Z)
+  | &&|\|\||;
+  | \\[\\"']
+  | [^"'\\&|;]+
+  | [\\&|]
+''', re.DOTALL | re.VERBOSE)
 
 
 def split_commands(cmd: str) -> list[str]:
     """Split command on &&, ||, ; (respecting quotes)."""
     segments = []
-    current = ""
-    quote = None
-    i = 0
-
-    while i < len(cmd):
-        char = cmd[i]
-
-        # Track quotes (ignore escaped by odd number of backslashes)
-        if char in ('"', "'"):
-            # Count consecutive backslashes before this character
-            backslash_count = 0
-            j = i - 1
-            while j >= 0 and cmd[j] == '\\':
-                backslash_count += 1
-                j -= 1
-            # Only treat as real quote if preceded by even number of backslashes
-            if backslash_count % 2 == 0:
-                if quote is None:
-                    quote = char
-                elif quote == char:
-                    quote = None
-
-        # Split on && || ; outside quotes
-        if quote is None:
-            if cmd[i:i+2] in ('&&', '||'):
-                if current.strip():
-                    segments.append(current)
-                current = ""
-                i += 2
-                continue
-            elif char == ';':
-                if current.strip():
-                    segments.append(current)
-                current = ""
-                i += 1
-                continue
-
-        current += char
-        i += 1
-
-    if current.strip():
-        segments.append(current)
+    current_parts = []
+    # Whether current_parts has anything besides whitespace, kept up to date
+    # per token so separators don't have to strip() the whole segment
+    has_nonspace = False
+
+    for token in TOKEN_RE.findall(cmd):
+        if token in ('&&', '||', ';'):
+            if has_nonspace:
+                segments.append("".join(current_parts))
+            current_parts = []
+            has_nonspace = False
+        else:
+            current_parts.append(token)
+            has_nonspace = has_nonspace or not token.isspace()
+
+    if has_nonspace:
+        segments.append("".join(current_parts))
 
     return segments
 
 
+# Characters that split_commands or clean_segment act on. A command with none
+# of them is a single segment that only needs surrounding whitespace stripped.
+SEGMENT_CHARS = frozenset('"\'\\&|;(){}=')
+
+
 def clean_segment(segment: str) -> str:
     """Clean a command segment: strip whitespace, subshell chars, env vars."""
     segment = segment.strip()
 
+    # Fast path: nothing to strip. An assignment has to start the segment, so
+    # the text up to the first = must be a variable name for there to be one.
+    eq = segment.find('=')
+    if (segment[:1] not in '({' and segment[-1:] not in ')}'
+            and (eq < 0 or not segment[:eq].isidentifier())):
+        return segment
+
     # Strip leading subshell/grouping: ( {
     while segment and segment[0] in '({':
         segment = segment[1:].lstrip()
@@ -173,26 +529,91 @@ def clean_segment(segment: str) -> str:
     return segment
 
 
-def check_patterns(segment: str, patterns: list[tuple[str, str]]) -> tuple[bool, str]:
-    """Check if segment matches any pattern. Returns (matched, section_name)."""
-    for pattern, section in patterns:
-        try:
-            if re.search(pattern, segment):
-                return True, section
-        except re.error as e:
-            print(f"Warning: Invalid regex '{pattern}' in {section}: {e}", file=sys.stderr)
+def check_patterns(segment: str, patterns: PatternSet) -> tuple[bool, str]:
+    """Check if segment matches any pattern. Returns (matched, section_name).
+
+    As when trying each pattern in config order, the section named is the
+    first one with a matching pattern, whichever check finds it. Checks that
+    can only find later sections than the best so far are skipped.
+    """
+    # Section index of the earliest match so far, past the end if none
+    best = len(patterns.sections)
+    best = patterns.exact.get(segment, best)
+    if segment.endswith('\n'):
+        # Like $, an exact literal also matches before a trailing newline
+        best = min(best, patterns.exact.get(segment[:-1], best))
+    if segment.startswith(patterns.prefixes):
+        # Find which ones with a dict lookup per distinct prefix length
+        for length in patterns.prefix_lengths:
+            best = min(best, patterns.prefix_sections.get(segment[:length], best))
+    if patterns.substring_automaton is not None:
+        for _, section in patterns.substring_automaton.iter(segment):
+            best = min(best, section)
+    else:
+        for i, substring in enumerate(patterns.substrings):
+            if patterns.substring_sections[i] >= best:
+                break
+            if substring in segment:
+                best = patterns.substring_sections[i]
+                break
+    # The first branch of the union that matches is the earliest one
+    if patterns.anchored is not None and patterns.anchored_sections[1] < best:
+        match = patterns.anchored.match(segment)
+        if match:
+            best = min(best, patterns.anchored_sections[match.lastindex])
+    if patterns.native_searched and patterns.native_sections[0] < best:
+        # RE2 agrees with re's ASCII mode on non-empty ASCII text, except that
+        # its \s skips \v and its $ doesn't match before a trailing newline
+        if (patterns.native_set is not None and segment and segment.isascii()
+                and '\v' not in segment and not segment.endswith('\n')):
+            hits = patterns.native_set.Match(segment)
+            if hits:
+                best = min(best, patterns.native_sections[min(hits)])
+        else:
+            for i, pat in enumerate(patterns.native_searched):
+                if patterns.native_sections[i] >= best:
+                    break
+                if pat.search(segment):
+                    best = patterns.native_sections[i]
+                    break
+    for i, pat in enumerate(patterns.searched):
+        if patterns.searched_sections[i] >= best:
+            break
+        if pat.search(segment):
+            best = patterns.searched_sections[i]
+            break
+    if best < len(patterns.sections):
+        return True, patterns.sections[best]
     return False, ""
 
 
+def decide_segment(segment: str, checks: list[tuple[PatternSet, str]]) -> tuple[str, str]:
+    """Decide a cleaned segment. Returns (decision, section_name).
+
+    checks holds (patterns, decision) pairs in priority order. A segment that
+    matches none of them is "ask", with an empty section name.
+    """
+    for patterns, decision in checks:
+        matched, section = check_patterns(segment, patterns)
+        if matched:
+            return decision, section
+    # Not in any list - mark as ask
+    return "ask", ""
+
+
+# Hook output with the decision and reason (as JSON strings) left to fill in
+DECISION_TEMPLATE = (
+    b'{"hookSpecificOutput":{"hookEventName":"PreToolUse",'
+    b'"permissionDecision":%s,"permissionDecisionReason":%s}}\n'
+)
+
+
 def output_decision(decision: str, reason: str):
     """Output JSON decision for Claude Code hook."""
-    print(json.dumps({
-        "hookSpecificOutput": {
-            "hookEventName": "PreToolUse",
-            "permissionDecision": decision,
-            "permissionDecisionReason": reason
-        }
-    }))
+    # json.dumps escapes to ASCII, including any lone surrogates in reason
+    sys.stdout.buffer.write(
+        DECISION_TEMPLATE % (json.dumps(decision).encode(), json.dumps(reason).encode())
+    )
 
 
 def main():
@@ -201,16 +622,13 @@ def main():
         sys.exit(1)
 
     config_path = sys.argv[1]
-    config = load_config(config_path)
 
     # Load patterns
-    deny_patterns = extract_patterns(config, "deny")
-    ask_patterns = extract_patterns(config, "ask")
-    allow_patterns = extract_patterns(config, "allow")
+    deny_patterns, ask_patterns, allow_patterns = load_patterns(config_path)
 
     # Read JSON input from stdin
     try:
-        input_data = json.load(sys.stdin)
+        input_data = json.loads(sys.stdin.buffer.read())
     except json.JSONDecodeError:
         # Invalid input, let it pass
         sys.exit(0)
@@ -219,43 +637,55 @@ def main():
     if not command:
         sys.exit(0)
 
-    # Split into segments
-    segments = split_commands(command)
+    # Split into cleaned segments
+    if SEGMENT_CHARS.isdisjoint(command):
+        segments = [command.strip()]
+    else:
+        segments = [clean_segment(segment) for segment in split_commands(command)]
+
+    # Every cleaned segment is a piece of the command, so deny literals that
+    # appear nowhere in the command can't match any segment
+    if not deny_patterns.has_literal_in(command):
+        deny_patterns.drop_literals()
+
+    # Only check categories that have patterns, in priority order. Anything
+    # they all miss falls through to ask.
+    checks = [
+        (patterns, decision)
+        for patterns, decision in (
+            (deny_patterns, "deny"),
+            (ask_patterns, "ask"),
+            (allow_patterns, "allow"),
+        )
+        if not patterns.is_empty()
+    ]
+    deny_checks = [check for check in checks if check[1] == "deny"]
 
     final_decision = "allow"
     final_reason = ""
     final_segment = ""
+    # Re-checking a segment can't change the outcome, so repeats are skipped
+    seen = set()
 
-    for segment in segments:
-        cleaned = clean_segment(segment)
-        if not cleaned:
+    for cleaned in segments:
+        if not cleaned or cleaned in seen:
             continue
+        seen.add(cleaned)
 
-        # Check DENY first
-        matched, section = check_patterns(cleaned, deny_patterns)
-        if matched:
+        decision, section = decide_segment(cleaned, checks)
+        if decision == "deny":
             output_decision("deny", f"Blocked: '{cleaned}' matches {section}")
             sys.exit(0)
 
-        # Check ASK
-        matched, section = check_patterns(cleaned, ask_patterns)
-        if matched:
-            if final_decision != "ask":
-                final_decision = "ask"
-                final_reason = f"'{cleaned}' matches {section}"
-                final_segment = cleaned
-            continue
-
-        # Check ALLOW
-        matched, _ = check_patterns(cleaned, allow_patterns)
-        if matched:
-            continue
-
-        # Not in any list - mark as ask
-        if final_decision != "ask":
+        if decision == "ask" and final_decision != "ask":
             final_decision = "ask"
-            final_reason = f"'{cleaned}' not in auto-approve list"
+            if section:
+                final_reason = f"'{cleaned}' matches {section}"
+            else:
+                final_reason = f"'{cleaned}' not in auto-approve list"
             final_segment = cleaned
+            # The result is ask now unless a later segment is denied
+            checks = deny_checks
 
     # Output final decision (always output explicitly)
     if final_decision == "ask":
@@ -69,24 +69,54 @@ fi
 # Capture stdin
 INPUT=$(cat)
 
-# Extract project name from cwd for log filename
-PROJECT=$(echo "$INPUT" | python3 -c "
+# Read the project name (from cwd, for the log filename), command and decision
+# reason with a single Python call. Only ask/deny decisions and errors are
+# logged, so allowed commands never pay for it. The hook input and output go
+# in on stdin (either can be larger than an argument may be) and the fields
+# come out, all NUL-separated.
+read_log_fields() {
+    local output="$1" default_command="$2" error_command="$3" complete=""
+    {
+        IFS= read -r -d '' PROJECT &&
+            IFS= read -r -d '' COMMAND &&
+            IFS= read -r -d '' REASON &&
+            complete=1
+    } < <(printf '%s\0%s' "$INPUT" "$output" | python3 -c "
 import sys, json, os
+hook_input, _, hook_output = sys.stdin.buffer.read().partition(b'\\0')
 try:
-    data = json.load(sys.stdin)
+    data = json.loads(hook_input)
     cwd = data.get('cwd', '')
-    print(os.path.basename(cwd) if cwd else 'unknown')
+    project = os.path.basename(cwd) if cwd else 'unknown'
 except:
-    print('unknown')
-" 2>/dev/null)
+    data, project = None, 'unknown'
+try:
+    command = data.get('tool_input', {}).get('command', sys.argv[1])
+except:
+    command = sys.argv[2]
+try:
+    reason = json.loads(hook_output).get('hookSpecificOutput', {}).get('permissionDecisionReason', '')
+except:
+    reason = ''
+for field in (project, command, reason):
+    # Drop trailing newlines like command substitution does
+    sys.stdout.write(str(field).replace('\\0', '').rstrip('\\n') + '\\0')
+" "$default_command" "$error_command" 2>/dev/null) || true
+    if [[ -z "$complete" ]]; then
+        # python3 itself is missing or failed
+        PROJECT="unknown"
+        COMMAND="$error_command"
+        REASON=""
+    fi
 
-# Log filename: YYYY-MM-DD-Day-project.log (sorts chronologically)
-# Use LC_ALL=C for consistent locale-independent day abbreviations
-if [[ -n "$LOG_DIR" ]]; then
-    LOG_FILE="$LOG_DIR/$(LC_ALL=C date '+%Y-%m-%d-%a')-${PROJECT}.log"
-else
-    LOG_FILE=""
-fi
+    # Log filename: YYYY-MM-DD-Day-project.log (sorts chronologically)
+    # Use LC_ALL=C for consistent locale-independent day abbreviations
+    if [[ -n "$LOG_DIR" ]]; then
+        LOG_FILE="$LOG_DIR/$(LC_ALL=C date '+%Y-%m-%d-%a')-${PROJECT}.log"
+    else
+        LOG_FILE=""
+    fi
+}
 
 # Helper to sanitize strings for logging (escape newlines and control chars)
 sanitize_for_log() {
@@ -97,7 +127,7 @@ sanitize_for_log() {
 # Capture stderr separately to avoid mixing with JSON output
 STDERR_FILE=$(mktemp)
 OUTPUT=$(echo "$INPUT" | python3 "$SCRIPT_DIR/validate-bash.py" "$CONFIG_FILE" 2>"$STDERR_FILE") || {
-    COMMAND=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_input',{}).get('command','<unknown>'))" 2>/dev/null || echo "<parse error>")
+    read_log_fields "" "<unknown>" "<parse error>"
     COMMAND=$(sanitize_for_log "$COMMAND")
     STDERR_CONTENT=$(cat "$STDERR_FILE" 2>/dev/null || true)
     rm -f "$STDERR_FILE"
@@ -117,29 +147,21 @@ OUTPUT=$(echo "$INPUT" | python3 "$SCRIPT_DIR/validate-bash.py" "$CONFIG_FILE" 2
 rm -f "$STDERR_FILE"
 
 # Only log ask/deny decisions (not allow) to reduce disk I/O
-if [[ -n "$LOG_FILE" ]]; then
+if [[ -n "$LOG_DIR" ]]; then
+    ACTION=""
     if echo "$OUTPUT" | grep -q '"permissionDecision": *"deny"'; then
-        COMMAND=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_input',{}).get('command',''))" 2>/dev/null)
-        REASON=$(echo "$OUTPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('hookSpecificOutput',{}).get('permissionDecisionReason',''))" 2>/dev/null)
-        COMMAND=$(sanitize_for_log "$COMMAND")
-        REASON=$(sanitize_for_log "$REASON")
-        {
-            echo "========================================"
-            echo "TIME:   $(LC_ALL=C date '+%Y-%m-%d %H:%M:%S')"
-            echo "ACTION: DENY"
-            echo "REASON: $REASON"
-            echo "CMD:    $COMMAND"
-            echo "========================================"
-        } >> "$LOG_FILE"
+        ACTION="DENY"
     elif echo "$OUTPUT" | grep -q '"permissionDecision": *"ask"'; then
-        COMMAND=$(echo "$INPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('tool_input',{}).get('command',''))" 2>/dev/null)
-        REASON=$(echo "$OUTPUT" | python3 -c "import sys,json; print(json.load(sys.stdin).get('hookSpecificOutput',{}).get('permissionDecisionReason',''))" 2>/dev/null)
+        ACTION="ASK"
+    fi
+    if [[ -n "$ACTION" ]]; then
+        read_log_fields "$OUTPUT" "" ""
         COMMAND=$(sanitize_for_log "$COMMAND")
         REASON=$(sanitize_for_log "$REASON")
         {
             echo "========================================"
             echo "TIME:   $(LC_ALL=C date '+%Y-%m-%d %H:%M:%S')"
-            echo "ACTION: ASK"
+            echo "ACTION: $ACTION"
             echo "REASON: $REASON"
             echo "CMD:    $COMMAND"
             echo "========================================"
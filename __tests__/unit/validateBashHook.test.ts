@@ -0,0 +1,173 @@
+import * as fs from 'fs';
+import * as path from 'path';
+import * as os from 'os';
+import { spawnSync } from 'child_process';
+
+const SCRIPT = path.join(__dirname, '..', '..', '.claude', 'hooks', 'validate-bash.py');
+
+interface HookOutput {
+  permissionDecision: string;
+  permissionDecisionReason: string;
+}
+
+describe('validate-bash.py', () => {
+  let tempDir: string;
+
+  beforeEach(() => {
+    tempDir = fs.mkdtempSync(path.join(os.tmpdir(), 'validate-bash-test-'));
+  });
+
+  afterEach(() => {
+    fs.rmSync(tempDir, { recursive: true, force: true });
+  });
+
+  const runHook = (command: string): HookOutput => {
+    const result = spawnSync('python3', [SCRIPT, path.join(tempDir, 'bash-patterns.toml')], {
+      input: JSON.stringify({ tool_input: { command } }),
+      encoding: 'utf8',
+      // Keep the compiled-pattern cache inside the test directory
+      env: { ...process.env, TMPDIR: tempDir },
+    });
+    expect(result.status).toBe(0);
+    return JSON.parse(result.stdout).hookSpecificOutput;
+  };
+
+  const decide = (config: string, command: string): string => {
+    fs.writeFileSync(path.join(tempDir, 'bash-patterns.toml'), config);
+    return runHook(command).permissionDecision;
+  };
+
+  describe('pattern cache', () => {
+    const denyRm = ['[deny.rm]', 'patterns = ["^rm "]'].join('\n');
+    const cacheDir = () => path.join(tempDir, `claude-hook-cache-${os.userInfo().uid}`);
+
+    it('is rebuilt when the config changes', () => {
+      expect(decide('[allow.all]\npatterns = ["^"]', 'rm -rf x')).toBe('allow');
+      expect(decide(`${denyRm}\n[allow.all]\npatterns = ["^"]`, 'rm -rf x')).toBe('deny');
+    });
+
+    it('is rebuilt when truncated or corrupt', () => {
+      expect(decide(denyRm, 'rm -rf x')).toBe('deny');
+      const [cacheName] = fs.readdirSync(cacheDir());
+      const cachePath = path.join(cacheDir(), cacheName);
+      const cached = fs.readFileSync(cachePath);
+
+      for (const broken of [cached.subarray(0, cached.length >> 1), Buffer.from('garbage')]) {
+        fs.writeFileSync(cachePath, broken);
+        expect(runHook('rm -rf x').permissionDecision).toBe('deny');
+        expect(fs.readFileSync(cachePath).equals(broken)).toBe(false);
+      }
+    });
+
+    it('is not used from a directory others can write to', () => {
+      fs.mkdirSync(cacheDir());
+      fs.chmodSync(cacheDir(), 0o777);
+
+      expect(decide(denyRm, 'rm -rf x')).toBe('deny');
+      expect(fs.readdirSync(cacheDir())).toEqual([]);
+    });
+  });
+
+  describe('command parsing', () => {
+    // Runs one of the script's functions on a single string argument
+    const call = (name: string, arg: string): unknown => {
+      const code = [
+        'import importlib.util, json, sys',
+        "spec = importlib.util.spec_from_file_location('validate_bash', sys.argv[1])",
+        'module = importlib.util.module_from_spec(spec)',
+        'spec.loader.exec_module(module)',
+        'print(json.dumps(getattr(module, sys.argv[2])(sys.stdin.read())))',
+      ].join('\n');
+      const result = spawnSync('python3', ['-c', code, SCRIPT, name], {
+        input: arg,
+        encoding: 'utf8',
+      });
+      expect(result.status).toBe(0);
+      return JSON.parse(result.stdout);
+    };
+
+    it.each([
+      // Odd and even runs of backslashes before a quote
+      ['echo "a\\"b" && ls', ['echo "a\\"b" ', ' ls']],
+      ['echo "a\\\\" && ls', ['echo "a\\\\" ', ' ls']],
+      ['echo "a\\\\\\"b" && ls', ['echo "a\\\\\\"b" ', ' ls']],
+      ['echo \\" && ls', ['echo \\" ', ' ls']],
+      // Unterminated quotes run to the end, as does a single-quoted string
+      // whose closing quote is backslashed (as the original parser did)
+      ['echo "open && ls', ['echo "open && ls']],
+      ["echo 'open && ls", ["echo 'open && ls"]],
+      ["echo 'a\\' && ls", ["echo 'a\\' && ls"]],
+      // Lone & and | don't split
+      ['a & b', ['a & b']],
+      ['a | b', ['a | b']],
+      ['echo "x" & y && z', ['echo "x" & y ', ' z']],
+      ['a || b; c', ['a ', ' b', ' c']],
+      ['a;;b', ['a', 'b']],
+    ])('splits %j', (command, segments) => {
+      expect(call('split_commands', command)).toEqual(segments);
+    });
+
+    it.each([
+      ['X=$(a (b)) cmd', 'cmd'],
+      ['X=$(unterminated cmd', ''],
+      // Only the variable name is stripped (as the original parser did)
+      ['X=$HOME/bin cmd', '/bin cmd'],
+      ['X="a b" Y=\'c d\' cmd', 'cmd'],
+      ['X="a\\" b" cmd', 'cmd'],
+      ['X=`date` cmd', 'cmd'],
+      ['( cd dir )', 'cd dir'],
+      ['ls X=1', 'ls X=1'],
+    ])('cleans %j', (segment, cleaned) => {
+      expect(call('clean_segment', segment)).toBe(cleaned);
+    });
+  });
+
+  it('denies with patterns that use numbered conditionals', () => {
+    const config = [
+      '[deny.bad]',
+      'patterns = ["^ls x", "^(sudo )?(?(1)rm|zzz)"]',
+      '[allow.all]',
+      'patterns = ["^"]',
+    ].join('\n');
+
+    expect(decide(config, 'sudo rm -rf x')).toBe('deny');
+    expect(decide(config, 'rm -rf x')).toBe('allow');
+  });
+
+  it('denies with anchored patterns whose alternation follows a comment', () => {
+    const config = [
+      '[deny.x]',
+      'patterns = ["^sudo(?#(note)|rm -rf", "^(?x: sudo  # start (\\n )|ssh "]',
+      '[allow.all]',
+      'patterns = ["^"]',
+    ].join('\n');
+
+    expect(decide(config, 'echo rm -rf /')).toBe('deny');
+    expect(decide(config, 'echo ssh host')).toBe('deny');
+    expect(decide(config, 'echo hello')).toBe('allow');
+  });
+
+  it('names the first matching section in config order', () => {
+    const config = [
+      '[deny.s0]',
+      'patterns = ["^ab|b"]',
+      '[deny.s1]',
+      'patterns = ["^(?i:ls)"]',
+    ].join('\n');
+
+    expect(decide(config, 'ls ab')).toBe('deny');
+    expect(runHook('ls ab').permissionDecisionReason).toBe("Blocked: 'ls ab' matches deny.s0");
+  });
+
+  it('denies with patterns that opt into Unicode after other flags', () => {
+    const config = [
+      '[deny.sudo]',
+      'patterns = ["(?i)(?u)^sudo\\\\s"]',
+      '[allow.all]',
+      'patterns = ["^"]',
+    ].join('\n');
+
+    expect(decide(config, 'SUDO ls')).toBe('deny');
+    expect(decide(config, 'ls')).toBe('allow');
+  });
+});